@@ -11,12 +11,34 @@ This benchmark demonstrates Neverust's ability to:
 
 import asyncio
 import aiohttp
+import os
 import random
 import hashlib
+import sys
 import time
-from typing import List, Dict, Set
+from collections import defaultdict
+from typing import List, Dict, Optional, Set
 import json
 
+# xxhash is a fast C hash for rendezvous scoring; blake2b is the stdlib fallback
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+# orjson parses stats responses several times faster than the stdlib
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
+# uvloop's libuv-based event loop is much faster for many concurrent sockets
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
 # Configuration
 NODES = [
     {'name': 'bootstrap', 'port': 9080},
@@ -24,89 +46,186 @@ NODES = [
     {'name': 'node2', 'port': 9082},
     {'name': 'node3', 'port': 9083},
 ]
+NODES_BY_NAME = {n['name']: n for n in NODES}
 
 BLOCKS_PER_NODE = 16  # Each node generates up to 16 blocks
 TARGET_REPLICATION = 3  # Blocks should be on at least 3 nodes
 BLOCK_SIZE_MIN = 1024  # 1KB
 BLOCK_SIZE_MAX = 102400  # 100KB
+REPLICATION_CHECK_INTERVAL = 0.5  # Re-check replication at least every 500ms
 PRUNE_CHECK_INTERVAL = 2  # Check every 2 seconds if we can prune
+NODE_LOAD_TTL = 5  # Seconds before cached node load is refreshed
+
+# HTTP client tuning - the default connector caps at 100 sockets, which
+# throttles the generation fan-out and the workers
+CONNECTOR_LIMIT = 512  # Total pooled connections
+CONNECTOR_LIMIT_PER_HOST = 128  # Pooled connections per node API
+KEEPALIVE_TIMEOUT = 75  # Seconds to keep idle sockets warm
+MAX_IN_FLIGHT = 32  # Concurrent block requests across all phases
+GENERATION_QUEUE_SIZE = 64  # Pending generation jobs buffered ahead of workers
+
+# Random bytes generated once; each block is a random window into this pool.
+# Four maximum-size blocks of headroom keep windows (and so CIDs) distinct.
+_RAND_POOL = bytearray(os.urandom(BLOCK_SIZE_MAX * 4))
+_RAND_POOL_VIEW = memoryview(_RAND_POOL)
 
 # Track which blocks are where
 block_locations: Dict[str, Set[str]] = {}  # CID -> set of node names
+node_to_cids: Dict[str, Set[str]] = defaultdict(set)  # node name -> CIDs it holds
 blocks_generated: Set[str] = set()
 blocks_pruned: Set[str] = set()
 
-async def generate_block(session: aiohttp.ClientSession, node: Dict) -> str:
-    """Generate a random block on a node and return its CID"""
-    size = random.randint(BLOCK_SIZE_MIN, BLOCK_SIZE_MAX)
-    data = random.randbytes(size)
-
-    url = f"http://localhost:{node['port']}/api/archivist/v1/data"
-
+# Active CIDs whose replica count is off target - the workers only visit these
+under_replicated: Set[str] = set()
+over_replicated: Set[str] = set()
+
+# Guards compound read-modify sequences on the tracking state above. Awaited
+# HTTP calls yield to other workers, so plans are made and results recorded
+# under the lock, but requests are never awaited while holding it.
+# Created in main() so it belongs to the loop asyncio.run() starts; on Python
+# 3.9 a lock built at import binds to a different loop.
+state_lock: Optional[asyncio.Lock] = None
+
+# Set whenever tracking state changes so workers wake on change instead of
+# polling; one event per worker so neither can clear the other's wake-up.
+# Created in main() alongside state_lock.
+replication_wakeup: Optional[asyncio.Event] = None
+pruning_wakeup: Optional[asyncio.Event] = None
+
+# Block count per node from its latest stats response, used for placement
+node_load: Dict[str, int] = {}
+node_load_refreshed = 0.0
+
+def random_payload(size: int) -> memoryview:
+    """Slice a block payload out of the shared random pool without copying"""
+    offset = random.randrange(len(_RAND_POOL) - size + 1)
+    return _RAND_POOL_VIEW[offset:offset + size]
+
+def score(node_name: str, cid: str) -> int:
+    """Rendezvous (highest random weight) score of a node for a CID"""
+    key = node_name.encode() + cid.encode()
+    if xxhash is not None:
+        return xxhash.xxh64_intdigest(key)
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), 'big')
+
+async def wait_for_change(wakeup: asyncio.Event, timeout: float):
+    """Sleep until tracking state changes, or at most timeout seconds"""
     try:
-        async with session.post(url, data=data, headers={'Content-Type': 'application/octet-stream'}) as resp:
-            if resp.status == 200:
-                cid = await resp.text()
-                cid = cid.strip('"')
-                print(f"✅ [{node['name']}] Generated block {cid[:16]}... ({size} bytes)")
-
-                # Track location
-                if cid not in block_locations:
-                    block_locations[cid] = set()
-                block_locations[cid].add(node['name'])
-                blocks_generated.add(cid)
-
-                return cid
-            else:
-                print(f"❌ [{node['name']}] Failed to generate block: {resp.status}")
-                return None
-    except Exception as e:
-        print(f"❌ [{node['name']}] Error generating block: {e}")
-        return None
-
-async def request_block_from_network(session: aiohttp.ClientSession, node: Dict, cid: str) -> bool:
+        await asyncio.wait_for(wakeup.wait(), timeout=timeout)
+    except asyncio.TimeoutError:
+        pass
+    wakeup.clear()
+
+def reindex_block(cid: str):
+    """Re-bucket a CID after its locations or pruned status changed"""
+    under_replicated.discard(cid)
+    over_replicated.discard(cid)
+    replication_wakeup.set()
+    pruning_wakeup.set()
+
+    if cid in blocks_pruned:
+        return
+
+    replicas = len(block_locations.get(cid, set()))
+    if replicas < TARGET_REPLICATION:
+        under_replicated.add(cid)
+    elif replicas > TARGET_REPLICATION:
+        over_replicated.add(cid)
+
+async def generate_block(session: aiohttp.ClientSession, sem: asyncio.Semaphore, node: Dict) -> str:
+    """Generate a random block on a node and return its CID"""
+    async with sem:
+        size = random.randint(BLOCK_SIZE_MIN, BLOCK_SIZE_MAX)
+        data = random_payload(size)
+
+        url = f"http://localhost:{node['port']}/api/archivist/v1/data"
+
+        try:
+            async with session.post(url, data=data, headers={'Content-Type': 'application/octet-stream'}) as resp:
+                if resp.status == 200:
+                    cid = await resp.text()
+                    cid = cid.strip('"')
+                    print(f"✅ [{node['name']}] Generated block {cid[:16]}... ({size} bytes)")
+
+                    # Track location
+                    async with state_lock:
+                        if cid not in block_locations:
+                            block_locations[cid] = set()
+                        block_locations[cid].add(node['name'])
+                        node_to_cids[node['name']].add(cid)
+                        blocks_generated.add(cid)
+                        reindex_block(cid)
+
+                    return cid
+                else:
+                    print(f"❌ [{node['name']}] Failed to generate block: {resp.status}")
+                    return None
+        except Exception as e:
+            print(f"❌ [{node['name']}] Error generating block: {e}")
+            return None
+
+async def request_block_from_network(session: aiohttp.ClientSession, sem: asyncio.Semaphore, node: Dict, cid: str) -> bool:
     """Request a block from the network via a specific node"""
     url = f"http://localhost:{node['port']}/api/archivist/v1/data/{cid}/network/stream"
 
-    try:
-        async with session.get(url) as resp:
-            if resp.status == 200:
-                data = await resp.read()
-                print(f"📥 [{node['name']}] Received {cid[:16]}... ({len(data)} bytes)")
-
-                # Track that this node now has the block
-                if cid not in block_locations:
-                    block_locations[cid] = set()
-                block_locations[cid].add(node['name'])
-
-                return True
-            else:
-                return False
-    except Exception as e:
-        return False
-
-async def prune_block(session: aiohttp.ClientSession, node: Dict, cid: str) -> bool:
+    async with sem:
+        try:
+            async with session.get(url) as resp:
+                if resp.status == 200:
+                    data = await resp.read()
+                    print(f"📥 [{node['name']}] Received {cid[:16]}... ({len(data)} bytes)")
+
+                    # Track that this node now has the block
+                    async with state_lock:
+                        if cid not in block_locations:
+                            block_locations[cid] = set()
+                        block_locations[cid].add(node['name'])
+                        node_to_cids[node['name']].add(cid)
+                        reindex_block(cid)
+
+                    return True
+                else:
+                    return False
+        except Exception as e:
+            return False
+
+async def prune_block(session: aiohttp.ClientSession, sem: asyncio.Semaphore, node: Dict, cid: str) -> bool:
     """Delete a block from a node"""
     url = f"http://localhost:{node['port']}/api/archivist/v1/data/{cid}"
 
-    try:
-        async with session.delete(url) as resp:
-            if resp.status == 200:
-                print(f"🗑️  [{node['name']}] Pruned {cid[:16]}... (replication sufficient)")
-
-                # Update tracking
-                if cid in block_locations and node['name'] in block_locations[cid]:
-                    block_locations[cid].remove(node['name'])
-                blocks_pruned.add(cid)
+    async with sem:
+        try:
+            async with session.delete(url) as resp:
+                if resp.status == 200:
+                    print(f"🗑️  [{node['name']}] Pruned {cid[:16]}... (replication sufficient)")
+
+                    # Update tracking
+                    async with state_lock:
+                        if cid in block_locations and node['name'] in block_locations[cid]:
+                            block_locations[cid].remove(node['name'])
+                        node_to_cids[node['name']].discard(cid)
+                        blocks_pruned.add(cid)
+                        reindex_block(cid)
+
+                    return True
+                else:
+                    return False
+        except Exception as e:
+            return False
+
+def check_block_exists_cached(node: Dict, cid: str) -> bool:
+    """Check the tracked index for whether a node has a specific block"""
+    return node['name'] in block_locations.get(cid, ())
+
+async def check_block_exists(session: aiohttp.ClientSession, node: Dict, cid: str, trusted: bool = True) -> bool:
+    """Check if a node has a specific block
+
+    Blocks found in the tracked index are trusted without a request; misses
+    are confirmed with an HTTP HEAD. Pass trusted=False to always ask the node.
+    """
+    if trusted and check_block_exists_cached(node, cid):
+        return True
 
-                return True
-            else:
-                return False
-    except Exception as e:
-        return False
-
-async def check_block_exists(session: aiohttp.ClientSession, node: Dict, cid: str) -> bool:
-    """Check if a node has a specific block"""
     url = f"http://localhost:{node['port']}/api/archivist/v1/data/{cid}"
 
     try:
@@ -122,50 +241,73 @@ async def get_node_stats(session: aiohttp.ClientSession, node: Dict) -> Dict:
     try:
         async with session.get(url) as resp:
             if resp.status == 200:
-                return await resp.json()
+                stats = await resp.json(loads=json_loads)
+                node_load[node['name']] = stats.get('block_count', 0)
+                return stats
             return {}
     except:
         return {}
 
-async def replication_worker(session: aiohttp.ClientSession):
+async def refresh_node_load(session: aiohttp.ClientSession):
+    """Re-poll node stats once the cached load is older than NODE_LOAD_TTL"""
+    global node_load_refreshed
+
+    if time.monotonic() - node_load_refreshed < NODE_LOAD_TTL:
+        return
+
+    node_load_refreshed = time.monotonic()
+    await asyncio.gather(*(get_node_stats(session, n) for n in NODES))
+
+def pick_replica_target(nodes_without: List[Dict], cid: str) -> Dict:
+    """Power of two choices: sample two candidates, keep the less loaded one"""
+    candidates = random.sample(nodes_without, min(2, len(nodes_without)))
+    # Equal loads fall back to the rendezvous score so ties stay deterministic
+    return min(candidates, key=lambda n: (node_load.get(n['name'], 0), -score(n['name'], cid)))
+
+async def replication_worker(session: aiohttp.ClientSession, sem: asyncio.Semaphore):
     """Continuously replicate blocks to achieve target replication"""
     while True:
-        for cid in list(blocks_generated):
-            if cid in blocks_pruned:
-                continue
+        await refresh_node_load(session)
 
-            current_replicas = len(block_locations.get(cid, set()))
-
-            if current_replicas < TARGET_REPLICATION:
+        requests = []
+        async with state_lock:
+            for cid in list(under_replicated):
                 # Find nodes that don't have this block
                 nodes_without = [n for n in NODES if n['name'] not in block_locations.get(cid, set())]
 
                 if nodes_without:
-                    target_node = random.choice(nodes_without)
-                    await request_block_from_network(session, target_node, cid)
+                    target_node = pick_replica_target(nodes_without, cid)
+                    # Count the pending transfer so later picks this tick see it
+                    node_load[target_node['name']] = node_load.get(target_node['name'], 0) + 1
+                    requests.append(request_block_from_network(session, sem, target_node, cid))
+
+        # Handle transfers as they finish; the semaphore bounds how many are in flight
+        for transfer in asyncio.as_completed(requests):
+            await transfer
 
-        await asyncio.sleep(0.5)  # Check every 500ms
+        await wait_for_change(replication_wakeup, REPLICATION_CHECK_INTERVAL)
 
-async def pruning_worker(session: aiohttp.ClientSession):
+async def pruning_worker(session: aiohttp.ClientSession, sem: asyncio.Semaphore):
     """Continuously prune blocks that have achieved sufficient replication"""
     while True:
-        for cid in list(blocks_generated):
-            if cid in blocks_pruned:
-                continue
+        deletions = []
+        async with state_lock:
+            for cid in list(over_replicated):
+                locations = block_locations.get(cid, set())
 
-            locations = block_locations.get(cid, set())
-
-            # If we have more than target replication, prune from random nodes
-            if len(locations) > TARGET_REPLICATION:
-                # Keep TARGET_REPLICATION, prune the rest
-                nodes_to_prune = list(locations)[TARGET_REPLICATION:]
+                # Keep the TARGET_REPLICATION highest-scoring nodes, prune the rest
+                ranked = sorted(locations, key=lambda name: score(name, cid), reverse=True)
+                nodes_to_prune = ranked[TARGET_REPLICATION:]
 
                 for node_name in nodes_to_prune:
-                    node = next((n for n in NODES if n['name'] == node_name), None)
+                    node = NODES_BY_NAME.get(node_name)
                     if node:
-                        await prune_block(session, node, cid)
+                        deletions.append(prune_block(session, sem, node, cid))
+
+        for deletion in asyncio.as_completed(deletions):
+            await deletion
 
-        await asyncio.sleep(PRUNE_CHECK_INTERVAL)
+        await wait_for_change(pruning_wakeup, PRUNE_CHECK_INTERVAL)
 
 async def stats_reporter(session: aiohttp.ClientSession):
     """Report aggregate statistics"""
@@ -174,36 +316,54 @@ async def stats_reporter(session: aiohttp.ClientSession):
         print(f"📊 BENCHMARK STATISTICS (t={time.time():.1f}s)")
         print("="*80)
 
-        total_blocks_generated = len(blocks_generated)
-        total_blocks_active = len([cid for cid in blocks_generated if cid not in blocks_pruned])
-        total_replicas = sum(len(locs) for locs in block_locations.values())
+        async with state_lock:
+            generated = list(blocks_generated)
+            total_blocks_generated = len(generated)
+            total_blocks_active = len([cid for cid in generated if cid not in blocks_pruned])
+            total_replicas = sum(len(locs) for locs in block_locations.values())
 
         print(f"Blocks Generated: {total_blocks_generated}")
         print(f"Blocks Active: {total_blocks_active}")
         print(f"Total Block Instances: {total_replicas}")
         print(f"Avg Replication Factor: {total_replicas / max(total_blocks_active, 1):.2f}")
 
-        # Per-node stats
-        for node in NODES:
-            stats = await get_node_stats(session, node)
-            blocks_stored = len([cid for cid, locs in block_locations.items() if node['name'] in locs])
+        # Per-node stats, fetched concurrently
+        all_stats = await asyncio.gather(*(get_node_stats(session, n) for n in NODES))
+        for node, stats in zip(NODES, all_stats):
+            blocks_stored = len(node_to_cids[node['name']])
             print(f"  [{node['name']}] Blocks: {blocks_stored}, Total Size: {stats.get('total_size', 0)} bytes")
 
         print("="*80 + "\n")
 
         await asyncio.sleep(5)  # Report every 5 seconds
 
-async def generation_phase(session: aiohttp.ClientSession):
+async def generation_phase(session: aiohttp.ClientSession, sem: asyncio.Semaphore):
     """Phase 1: Generate blocks on each node"""
     print("\n🚀 PHASE 1: BLOCK GENERATION")
     print("="*80)
 
-    tasks = []
+    # Bounded producer/consumer: jobs are queued lazily so only MAX_IN_FLIGHT
+    # payloads are ever allocated at once
+    queue: asyncio.Queue = asyncio.Queue(maxsize=GENERATION_QUEUE_SIZE)
+
+    async def consumer():
+        while True:
+            node = await queue.get()
+            try:
+                await generate_block(session, sem, node)
+            finally:
+                queue.task_done()
+
+    consumers = [asyncio.create_task(consumer()) for _ in range(MAX_IN_FLIGHT)]
+
     for node in NODES:
         for i in range(BLOCKS_PER_NODE):
-            tasks.append(generate_block(session, node))
+            await queue.put(node)
 
-    await asyncio.gather(*tasks)
+    await queue.join()
+    for task in consumers:
+        task.cancel()
+    await asyncio.gather(*consumers, return_exceptions=True)
     print(f"\n✅ Generated {len(blocks_generated)} total blocks\n")
 
 async def main():
@@ -215,19 +375,42 @@ async def main():
     print(f"Block size range: {BLOCK_SIZE_MIN}-{BLOCK_SIZE_MAX} bytes")
     print("="*80 + "\n")
 
-    async with aiohttp.ClientSession() as session:
+    connector = aiohttp.TCPConnector(
+        limit=CONNECTOR_LIMIT,
+        limit_per_host=CONNECTOR_LIMIT_PER_HOST,
+        ttl_dns_cache=300,
+        keepalive_timeout=KEEPALIVE_TIMEOUT,
+        enable_cleanup_closed=True,
+        ssl=False,  # Node APIs are plain HTTP
+    )
+    timeout = aiohttp.ClientTimeout(total=30, connect=5)
+
+    global state_lock, replication_wakeup, pruning_wakeup
+    state_lock = asyncio.Lock()
+    replication_wakeup = asyncio.Event()
+    pruning_wakeup = asyncio.Event()
+
+    sem = asyncio.Semaphore(MAX_IN_FLIGHT)
+
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
         # Phase 1: Generate blocks
-        await generation_phase(session)
+        await generation_phase(session, sem)
 
         # Phase 2: Start background workers
         print("🚀 PHASE 2: REPLICATION & PRUNING")
         print("="*80 + "\n")
 
         await asyncio.gather(
-            replication_worker(session),
-            pruning_worker(session),
+            replication_worker(session, sem),
+            pruning_worker(session, sem),
             stats_reporter(session)
         )
 
 if __name__ == '__main__':
-    asyncio.run(main())
+    if uvloop is None:
+        asyncio.run(main())
+    elif sys.version_info >= (3, 12):
+        asyncio.run(main(), loop_factory=uvloop.new_event_loop)
+    else:
+        uvloop.install()
+        asyncio.run(main())
@@ -6,6 +6,32 @@ Generate docker-compose.yml for N-node Neverust cluster with monitoring.
 import sys
 import yaml
 
+# libyaml's C emitter is much faster for large clusters; fall back to pure Python
+try:
+    from yaml import CSafeDumper as BaseDumper
+except ImportError:
+    from yaml import SafeDumper as BaseDumper
+
+
+class ComposeDumper(BaseDumper):
+    """YAML dumper that writes shared node sections inline instead of as anchors."""
+
+    def ignore_aliases(self, data):
+        return True
+
+
+def worker_command(mode):
+    """Container command for a worker node in the given mode."""
+    return [
+        'start',
+        '--mode', mode,
+        '--listen-port', '8070',
+        '--disc-port', '8090',
+        '--api-port', '8080',
+        '--data-dir', '/data',
+        '--log-level', 'warn'  # Reduce log noise
+    ]
+
 def generate_compose(num_nodes=50):
     """Generate docker-compose configuration for N nodes + monitoring stack."""
 
@@ -54,44 +80,52 @@ def generate_compose(num_nodes=50):
         }
     }
 
-    # Worker nodes
-    for i in range(1, num_nodes + 1):
+    # Worker nodes - one template holds everything shared; each node only
+    # overrides its identity, address and mode
+    commands = {
+        'altruistic': worker_command('altruistic'),
+        'marketplace': worker_command('marketplace'),
+    }
+    node_template = {
+        'build': '..',
+        'container_name': None,  # Per-node fields keep their position in the output
+        'hostname': None,
+        'networks': None,
+        'depends_on': ['bootstrap'],
+        'command': None,
+        'environment': {
+            'BOOTSTRAP_NODE': 'bootstrap:8080'
+        },
+        'healthcheck': {
+            'test': ['CMD', 'curl', '-f', 'http://localhost:8080/health'],
+            'interval': '10s',
+            'timeout': '3s',
+            'retries': 3,
+            'start_period': '10s'
+        }
+    }
+    node_names = [f'node{i}' for i in range(1, num_nodes + 1)]
+
+    for i, name in enumerate(node_names, start=1):
         node_ip = f'172.25.{(i // 254) + 1}.{(i % 254) + 1}'
+        mode = 'altruistic' if i % 3 else 'marketplace'  # 1/3 marketplace nodes
 
-        compose['services'][f'node{i}'] = {
-            'build': '..',
-            'container_name': f'neverust-node{i}',
-            'hostname': f'node{i}',
+        service = node_template | {
+            'container_name': f'neverust-{name}',
+            'hostname': name,
             'networks': {
                 'neverust-net': {
                     'ipv4_address': node_ip
                 }
             },
-            'depends_on': ['bootstrap'],
-            'command': [
-                'start',
-                '--mode', 'altruistic' if i % 3 != 0 else 'marketplace',  # 1/3 marketplace nodes
-                '--listen-port', '8070',
-                '--disc-port', '8090',
-                '--api-port', '8080',
-                '--data-dir', '/data',
-                '--log-level', 'warn'  # Reduce log noise
-            ],
-            'environment': {
-                'BOOTSTRAP_NODE': 'bootstrap:8080'
-            },
-            'healthcheck': {
-                'test': ['CMD', 'curl', '-f', 'http://localhost:8080/health'],
-                'interval': '10s',
-                'timeout': '3s',
-                'retries': 3,
-                'start_period': '10s'
-            }
+            'command': commands[mode],
         }
 
         # Expose API for first 5 nodes (for testing)
         if i <= 5:
-            compose['services'][f'node{i}']['ports'] = [f'{9080 + i}:8080']
+            service['ports'] = [f'{9080 + i}:8080']
+
+        compose['services'][name] = service
 
     # Prometheus
     compose['services']['prometheus'] = {
@@ -151,7 +185,7 @@ if __name__ == '__main__':
     compose = generate_compose(num_nodes)
 
     with open('docker-compose.yml', 'w') as f:
-        yaml.dump(compose, f, default_flow_style=False, sort_keys=False)
+        yaml.dump(compose, f, Dumper=ComposeDumper, default_flow_style=False, sort_keys=False)
 
     print(f"✅ Generated docker-compose.yml for {num_nodes} nodes + monitoring stack")
     print(f"📊 Services: Bootstrap + {num_nodes} workers + Prometheus + Grafana + Visualizer")
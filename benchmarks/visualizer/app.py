@@ -4,64 +4,79 @@ Neverust Network Visualizer - Real-time D3.js dashboard
 """
 
 import os
-import time
-import threading
+import orjson
 from flask import Flask, render_template
 from flask_socketio import SocketIO, emit
 from prometheus_api_client import PrometheusConnect
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+class OrjsonWrapper:
+    """orjson behind the str-based dumps/loads interface python-socketio expects."""
+
+    @staticmethod
+    def dumps(obj, *args, **kwargs):
+        # orjson output is already compact, so separators etc. can be ignored
+        return orjson.dumps(obj).decode()
+
+    @staticmethod
+    def loads(s, *args, **kwargs):
+        return orjson.loads(s)
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'neverust-viz-secret'
-socketio = SocketIO(app, cors_allowed_origins="*")
+socketio = SocketIO(app, cors_allowed_origins="*", json=OrjsonWrapper)
 
 PROMETHEUS_URL = os.getenv('PROMETHEUS_URL', 'http://prometheus:9090')
 NUM_NODES = int(os.getenv('NUM_NODES', 50))
 
-prom = PrometheusConnect(url=PROMETHEUS_URL, disable_ssl=True)
+# One pooled HTTP session for every Prometheus query
+PROM_RETRY = Retry(total=3, backoff_factor=1, status_forcelist=[408, 429, 500, 502, 503, 504])
+prom_session = requests.Session()
+prom_session.verify = False
+prom = PrometheusConnect(url=PROMETHEUS_URL, retry=PROM_RETRY, session=prom_session)
+# PrometheusConnect mounts its own adapter for the URL; replace it with a larger pool
+prom_session.mount(PROMETHEUS_URL, HTTPAdapter(pool_connections=8, pool_maxsize=16, max_retries=PROM_RETRY))
+
+# All per-node metrics are fetched in a single query and dispatched by name
+NODE_METRICS_QUERY = '{__name__=~"neverust_block_count|neverust_block_bytes|neverust_uptime_seconds"}'
+METRIC_FIELDS = {
+    'neverust_block_count': 'block_count',
+    'neverust_block_bytes': 'block_bytes',
+    'neverust_uptime_seconds': 'uptime',
+}
 
 def get_node_metrics():
     """Fetch metrics for all nodes from Prometheus."""
     try:
-        # Block count per node
-        block_counts = prom.custom_query('neverust_block_count')
-        # Block bytes per node
-        block_bytes = prom.custom_query('neverust_block_bytes')
-        # Uptime per node
-        uptimes = prom.custom_query('neverust_uptime_seconds')
+        samples = prom.custom_query(NODE_METRICS_QUERY)
 
         metrics = {}
-        for metric in block_counts:
-            instance = metric['metric'].get('instance', 'unknown')
-            node_id = instance.split(':')[0]
-            metrics[node_id] = {
-                'block_count': int(metric['value'][1]),
+        for metric in samples:
+            field = METRIC_FIELDS.get(metric['metric'].get('__name__'))
+            if field is None:
+                continue
+
+            # Prometheus relabels each target with its hostname as `node`;
+            # parsing `instance` is only a fallback for other scrape configs
+            labels = metric['metric']
+            node_id = labels.get('node') or labels.get('instance', 'unknown').split(':')[0]
+            node_metrics = metrics.setdefault(node_id, {
+                'block_count': 0,
                 'block_bytes': 0,
                 'uptime': 0,
                 'health': 'up'
-            }
-
-        for metric in block_bytes:
-            instance = metric['metric'].get('instance', 'unknown')
-            node_id = instance.split(':')[0]
-            if node_id in metrics:
-                metrics[node_id]['block_bytes'] = int(metric['value'][1])
-
-        for metric in uptimes:
-            instance = metric['metric'].get('instance', 'unknown')
-            node_id = instance.split(':')[0]
-            if node_id in metrics:
-                metrics[node_id]['uptime'] = int(metric['value'][1])
+            })
+            node_metrics[field] = int(float(metric['value'][1]))
 
         return metrics
     except Exception as e:
         print(f"Error fetching metrics: {e}")
         return {}
 
-def get_network_topology():
-    """Generate network topology from active nodes."""
-    metrics = get_node_metrics()
-
+def build_topology_skeleton():
+    """Build the static node/link structure once; only metrics change per tick."""
     nodes = []
     links = []
 
@@ -70,22 +85,22 @@ def get_network_topology():
         'id': 'bootstrap',
         'name': 'Bootstrap',
         'type': 'bootstrap',
-        'block_count': metrics.get('bootstrap', {}).get('block_count', 0),
-        'block_bytes': metrics.get('bootstrap', {}).get('block_bytes', 0)
+        'block_count': 0,
+        'block_bytes': 0,
+        'health': 'down'
     })
 
     # Worker nodes
     for i in range(1, NUM_NODES + 1):
         node_id = f'node{i}'
-        node_metrics = metrics.get(node_id, {})
 
         nodes.append({
             'id': node_id,
             'name': f'Node {i}',
             'type': 'marketplace' if i % 3 == 0 else 'altruistic',
-            'block_count': node_metrics.get('block_count', 0),
-            'block_bytes': node_metrics.get('block_bytes', 0),
-            'health': node_metrics.get('health', 'down')
+            'block_count': 0,
+            'block_bytes': 0,
+            'health': 'down'
         })
 
         # Create links to bootstrap
@@ -105,12 +120,30 @@ def get_network_topology():
 
     return {'nodes': nodes, 'links': links}
 
+TOPOLOGY_SKELETON = build_topology_skeleton()
+
+def update_topology(metrics):
+    """Apply per-node metrics to the skeleton and return the nodes that changed."""
+    updates = {}
+    for node in TOPOLOGY_SKELETON['nodes']:
+        node_metrics = metrics.get(node['id'], {})
+        state = {
+            'block_count': node_metrics.get('block_count', 0),
+            'block_bytes': node_metrics.get('block_bytes', 0),
+            'health': node_metrics.get('health', 'down')
+        }
+        if any(node[key] != value for key, value in state.items()):
+            node.update(state)
+            updates[node['id']] = state
+
+    return updates
+
 def broadcast_metrics():
-    """Background thread to broadcast metrics every 2 seconds."""
+    """Background task to broadcast metrics every 2 seconds."""
     while True:
         try:
-            topology = get_network_topology()
             metrics = get_node_metrics()
+            updates = update_topology(metrics)
 
             # Calculate aggregate stats
             total_blocks = sum(m.get('block_count', 0) for m in metrics.values())
@@ -118,7 +151,7 @@ def broadcast_metrics():
             active_nodes = len([m for m in metrics.values() if m.get('health') == 'up'])
 
             data = {
-                'topology': topology,
+                'updates': updates,
                 'stats': {
                     'total_blocks': total_blocks,
                     'total_bytes': total_bytes,
@@ -127,11 +160,11 @@ def broadcast_metrics():
                 }
             }
 
-            socketio.emit('metrics_update', data)
+            socketio.emit('metrics_delta', data)
         except Exception as e:
             print(f"Error broadcasting metrics: {e}")
 
-        time.sleep(2)
+        socketio.sleep(2)
 
 @app.route('/')
 def index():
@@ -142,9 +175,8 @@ def index():
 def handle_connect():
     """Handle client connection."""
     print('Client connected')
-    # Send initial data
-    topology = get_network_topology()
-    emit('metrics_update', {'topology': topology, 'stats': {}})
+    # Send the full topology once; later ticks only carry deltas
+    emit('metrics_update', {'topology': TOPOLOGY_SKELETON, 'stats': {}})
 
 @socketio.on('disconnect')
 def handle_disconnect():
@@ -152,9 +184,8 @@ def handle_disconnect():
     print('Client disconnected')
 
 if __name__ == '__main__':
-    # Start metrics broadcast thread
-    metrics_thread = threading.Thread(target=broadcast_metrics, daemon=True)
-    metrics_thread.start()
+    # Start metrics broadcast under the server's async mode
+    socketio.start_background_task(broadcast_metrics)
 
     # Run Flask app
     socketio.run(app, host='0.0.0.0', port=8888, debug=True, allow_unsafe_werkzeug=True)